@@ -41,11 +41,11 @@ def display_response(raw_response: str):
         logging.error(f"Decoding error: {e}")
 
 
-def handle_file_transfer(sock: socket.socket, file_size: int, dest_path: str):
+def handle_file_transfer(reader: protocol.MessageReader, file_size: int, dest_path: str):
     """Receives binary data and saves to file.
 
     Args:
-        sock (socket.socket): Connected socket.
+        reader (protocol.MessageReader): Reader of the connected socket.
         file_size (int): Bytes to receive.
         dest_path (str): Save path.
 
@@ -55,18 +55,10 @@ def handle_file_transfer(sock: socket.socket, file_size: int, dest_path: str):
     print(f"Receiving {file_size} bytes...")
     logging.info(f"Downloading file to {dest_path}")
 
-    bytes_recd = 0
-    chunks = []
-
-    while bytes_recd < file_size:
-        chunk = sock.recv(min(file_size - bytes_recd, 4096))
-        if not chunk:
-            logging.error("Connection lost during transfer")
-            return False
-        chunks.append(chunk)
-        bytes_recd += len(chunk)
-
-    file_content = b"".join(chunks)
+    file_content = reader.read_exact(file_size)
+    if file_content is None:
+        logging.error("Connection lost during transfer")
+        return False
 
     try:
         os.makedirs(os.path.dirname(dest_path) or '.', exist_ok=True)
@@ -84,7 +76,7 @@ def validate_environment():
     assert isinstance(SERVER_IP, str), "IP must be string"
     assert len(SERVER_IP.split('.')) == 4, "Invalid IP format"
     assert isinstance(PORT, int), "Port must be int"
-    assert hasattr(protocol, 'create_command_message'), "Protocol missing methods"
+    assert hasattr(protocol, 'create_command_frame'), "Protocol missing methods"
     logging.info("Environment validation passed.")
 
 
@@ -93,6 +85,7 @@ def main():
     client_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
     try:
         client_socket.connect((SERVER_IP, PORT))
+        reader = protocol.MessageReader(client_socket)
         print(f" Successfully connected to server at {SERVER_IP}:{PORT}")
         logging.info("Connected to server")
 
@@ -100,6 +93,7 @@ def main():
         print("EXECUTE C:\\Windows\\System32\\notepad.exe")
         print("EXECUTE C:\\Program Files\\Microsoft Office\\root\\Office16\\WINWORD.EXE")
         print("COPY C:\\a.txt/C:\\b.txt")
+        print("COPY C:\\a.txt/C:\\b.txt/PRESERVE")
         print("DIR C:\\Users\\public\\")
         print("DELETE C:\\temp\\file.txt")
         print("SCREENSHOT")
@@ -116,10 +110,10 @@ def main():
             command = parts[0].upper()
             params = parts[1].split(protocol.PARAM_SEPARATOR) if len(parts) > 1 else []
 
-            msg = protocol.create_command_message(command, params)
-            protocol.send_message(client_socket, msg)
+            frame = protocol.create_command_frame(command, params)
+            protocol.send_frame(client_socket, frame)
 
-            raw_resp = protocol.receive_message(client_socket)
+            raw_resp = reader.read_frame()
             if not raw_resp:
                 print("Server closed the connection.")
                 break
@@ -129,8 +123,8 @@ def main():
                 file_info = protocol.parse_message(raw_resp)
                 size = int(file_info['params'][0])
 
-                handle_file_transfer(client_socket, size, dest)
-                raw_resp = protocol.receive_message(client_socket)
+                handle_file_transfer(reader, size, dest)
+                raw_resp = reader.read_frame()
                 if not raw_resp:
                     break
 
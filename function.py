@@ -2,16 +2,125 @@
 # Date   - 11/22/25
 # Function
 
+import io
 import os
+import re
 import shutil
+import stat
+import socket
 import subprocess
+import sys
 import glob
+import fnmatch
 import logging
-import pyautogui
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import lru_cache, wraps
+import mss
+from PIL import Image
 import protocol_utils as protocol
 
 SCREENSHOT_FILENAME = "screenshot.jpg"
 TEMP_DIR = "server_temp"
+SCREENSHOT_PATH = os.path.join(TEMP_DIR, SCREENSHOT_FILENAME)
+WILDCARD_RE = re.compile(r'[*?\[]')
+SAVE_SCREENSHOT_TO_DISK = False
+SCREENSHOT_QUALITY = 60
+SCREENSHOT_MAX_SIZE = (1920, 1080)
+DIR_CACHE_SIZE = 256
+PATTERN_CACHE_SIZE = 256
+
+_LAST_SCREENSHOT: Future | None = None
+_SCT = None
+_SCT_LOCK = threading.Lock()
+_SCREENSHOT_EXECUTOR = ThreadPoolExecutor(max_workers=1, thread_name_prefix='screenshot')
+
+os.makedirs(TEMP_DIR, exist_ok=True)
+
+
+@lru_cache(maxsize=PATTERN_CACHE_SIZE)
+def _compile_name_pattern(name_pattern: str):
+    """Translates an fnmatch pattern into a compiled regex, once per distinct pattern.
+
+    Args:
+        name_pattern (str): The fnmatch pattern (e.g., '*.txt').
+
+    Returns:
+        function: The compiled regex's match method.
+    """
+    return re.compile(fnmatch.translate(os.path.normcase(name_pattern))).match
+
+
+@lru_cache(maxsize=DIR_CACHE_SIZE)
+def _dir_listing(directory: str, _mtime_ns: int, name_pattern: str | None = None) -> tuple:
+    """Lists a directory with os.scandir, caching the result per directory modification time.
+
+    Args:
+        directory (str): The directory to scan.
+        _mtime_ns (int): The directory's st_mtime_ns. Only used as part of the cache key,
+                         so any change to the directory invalidates its cached listing.
+        name_pattern (str | None): Optional fnmatch pattern the entry names must match.
+
+    Returns:
+        tuple: The entry names, directories suffixed with '/'.
+               Hidden (dot) entries are skipped unless the pattern asks for them, like glob.
+    """
+    with os.scandir(directory) as entries:
+        if name_pattern is None:
+            return tuple(entry.name + ('/' if entry.is_dir(follow_symlinks=False) else '')
+                         for entry in entries if not entry.name.startswith('.'))
+
+        # Matches like fnmatch.filter: names are normcased only where that is not a no-op
+        match = _compile_name_pattern(name_pattern)
+        fold_case = os.name == 'nt'
+        show_hidden = name_pattern.startswith('.')
+        return tuple(entry.name + ('/' if entry.is_dir(follow_symlinks=False) else '')
+                     for entry in entries
+                     if match(os.path.normcase(entry.name) if fold_case else entry.name)
+                     and (show_hidden or not entry.name.startswith('.')))
+
+
+def _scan_dir(directory: str, name_pattern: str) -> list:
+    """Lists the entries of a directory whose names match a pattern.
+
+    Args:
+        directory (str): The directory to scan.
+        name_pattern (str): The fnmatch pattern the entry names must match.
+
+    Returns:
+        list: The matching entry names, or an empty list if the directory does not exist.
+    """
+    try:
+        mtime_ns = os.stat(directory).st_mtime_ns
+        return list(_dir_listing(directory, mtime_ns, name_pattern))
+    except (FileNotFoundError, NotADirectoryError):
+        return []
+
+
+def _split_literal_prefix(pattern: str) -> tuple:
+    """Splits a path pattern at its first path component that contains a wildcard.
+
+    Args:
+        pattern (str): The path or glob pattern (e.g., 'C:\\Users\\X\\Documents\\*.txt').
+
+    Returns:
+        tuple: (literal_prefix: str, remainder: str)
+               The remainder starts at the first wildcard component and is empty
+               when the pattern has no wildcards at all.
+    """
+    drive, path = os.path.splitdrive(pattern)
+    if os.altsep:
+        path = path.replace(os.altsep, os.sep)
+
+    components = path.split(os.sep)
+    for index, component in enumerate(components):
+        if WILDCARD_RE.search(component):
+            literal_prefix = os.sep.join(components[:index])
+            if not literal_prefix and path.startswith(os.sep):
+                literal_prefix = os.sep
+            return drive + literal_prefix, os.sep.join(components[index:])
+
+    return pattern, ''
 
 
 def handle_dir(params: list, _sock):
@@ -27,10 +136,16 @@ def handle_dir(params: list, _sock):
                Type can be 'LIST' (for file names) or 'TEXT'.
     """
     path_or_pattern = params[0] if params and params[0] else os.getcwd()
-    logging.info(f"Handling DIR command for: {path_or_pattern}")
-
-    is_dir_no_wildcards = os.path.isdir(path_or_pattern) and not any(
-        char in path_or_pattern for char in ['*', '?'])
+    logging.info("Handling DIR command for: %s", path_or_pattern)
+
+    path_stat = None
+    has_wildcards = WILDCARD_RE.search(path_or_pattern) is not None
+    if not has_wildcards:
+        try:
+            path_stat = os.stat(path_or_pattern)
+        except OSError:
+            pass
+    is_dir_no_wildcards = path_stat is not None and stat.S_ISDIR(path_stat.st_mode)
 
     if is_dir_no_wildcards:
         search_pattern = os.path.join(path_or_pattern, "*")
@@ -38,33 +153,61 @@ def handle_dir(params: list, _sock):
         search_pattern = path_or_pattern
 
     try:
-        full_path_list = glob.glob(search_pattern, recursive=False)
-        content = []
-
-        for item_path in full_path_list:
-            item_name = os.path.basename(item_path)
-            if os.path.isdir(item_path) and not item_name.endswith('/'):
-                display_name = item_name + '/'
+        if is_dir_no_wildcards:
+            content = list(_dir_listing(path_or_pattern, path_stat.st_mtime_ns))
+        elif not has_wildcards:
+            # A literal file path matches only itself; no need to scan its parent directory
+            if path_stat is not None or os.path.lexists(path_or_pattern):
+                content = [os.path.basename(path_or_pattern)]
+            else:
+                content = []
+        else:
+            literal_prefix, remainder = _split_literal_prefix(search_pattern)
+            if os.sep in remainder or '**' in remainder:
+                full_path_list = glob.glob(search_pattern, recursive=False)
+                content = [os.path.basename(item_path) + ('/' if os.path.isdir(item_path) else '')
+                           for item_path in full_path_list]
             else:
-                display_name = item_name
-            content.append(display_name)
+                content = _scan_dir(literal_prefix or os.curdir, remainder)
 
         if not content:
-            if os.path.exists(path_or_pattern):
+            if path_stat is not None or os.path.exists(path_or_pattern):
                 logging.warning("DIR: Directory exists but is empty/no match.")
                 return 'OK', 'TEXT', f"No matches found for: {search_pattern}"
             else:
                 logging.error("DIR: Path does not exist.")
                 return 'ERROR', 'TEXT', f"Path does not exist: {path_or_pattern}"
 
-        logging.info(f"DIR success. Found {len(content)} items.")
+        logging.info("DIR success. Found %d items.", len(content))
         return 'OK', 'LIST', content
 
     except Exception as err:
-        logging.error(f"DIR Exception: {err}")
+        logging.error("DIR Exception: %s", err)
         return 'ERROR', 'TEXT', f"Error accessing directory: {err}"
 
 
+def requires_params(n: int, err: str):
+    """Decorator that rejects a command when its first n parameters are missing or empty.
+
+    Args:
+        n (int): The number of required parameters.
+        err (str): The error text returned to the client.
+
+    Returns:
+        function: The decorator wrapping a handler with the parameter check.
+    """
+    def decorator(handler):
+        @wraps(handler)
+        def wrapper(params: list, sock):
+            if len(params) < n or not all(params[:n]):
+                logging.error("%s: %s", handler.__name__, err)
+                return 'ERROR', 'TEXT', err
+            return handler(params, sock)
+        return wrapper
+    return decorator
+
+
+@requires_params(1, 'Missing file path.')
 def handle_delete(params: list, _sock):
     """Handles the DELETE command to remove a specified file.
 
@@ -77,26 +220,26 @@ def handle_delete(params: list, _sock):
                Status can be 'OK' or 'ERROR'.
                Type is always 'TEXT'.
     """
-    if not params or not params[0]:
-        logging.error("DELETE: Missing file path")
-        return 'ERROR', 'TEXT', 'Missing file path.'
-
     file_path = params[0]
-    logging.info(f"Handling DELETE for: {file_path}")
+    logging.info("Handling DELETE for: %s", file_path)
     try:
         os.remove(file_path)
         logging.info("DELETE success")
         return 'OK', 'TEXT', f"File {file_path} deleted successfully."
     except Exception as err:
-        logging.error(f"DELETE error: {err}")
+        logging.error("DELETE error: %s", err)
         return 'ERROR', 'TEXT', f"Error deleting file: {err}"
 
 
+@requires_params(2, 'Missing source or destination path.')
 def handle_copy(params: list, _sock):
     """Handles the COPY command to duplicate a file on the server.
 
+    Only the file data is copied unless 'PRESERVE' is passed as a third parameter,
+    in which case timestamps and permission bits are copied as well (shutil.copy2).
+
     Args:
-        params (list): A list containing [Source Path, Destination Path].
+        params (list): A list containing [Source Path, Destination Path, optional 'PRESERVE'].
         _sock: The client socket object (unused in this function).
 
     Returns:
@@ -104,24 +247,29 @@ def handle_copy(params: list, _sock):
                Status can be 'OK' or 'ERROR'.
                Type is always 'TEXT'.
     """
-    if len(params) < 2:
-        logging.error("COPY: Missing source or dest")
-        return 'ERROR', 'TEXT', 'Missing source or destination path.'
-
     src, dst = params[0], params[1]
-    logging.info(f"Handling COPY from {src} to {dst}")
+    logging.info("Handling COPY from %s to %s", src, dst)
     try:
-        shutil.copy2(src, dst)
+        if len(params) >= 3 and params[2].upper() == 'PRESERVE':
+            shutil.copy2(src, dst)
+        else:
+            if os.path.isdir(dst):
+                dst = os.path.join(dst, os.path.basename(src))
+            shutil.copyfile(src, dst)
         logging.info("COPY success")
         return 'OK', 'TEXT', f"File copied from {src} to {dst}."
     except Exception as err:
-        logging.error(f"COPY error: {err}")
+        logging.error("COPY error: %s", err)
         return 'ERROR', 'TEXT', f"Error copying file: {err}"
 
 
+@requires_params(1, 'Missing program path.')
 def handle_execute(params: list, _sock):
     """Handles the EXECUTE command, launching a program or opening a file on the server.
 
+    The program is started fire-and-forget without handle inheritance scanning. On Windows it
+    is fully detached (own process group, no console), so it outlives the server.
+
     Args:
         params (list): A list containing the path to the executable or document.
         _sock: The client socket object (unused in this function).
@@ -131,23 +279,67 @@ def handle_execute(params: list, _sock):
                Status can be 'OK' or 'ERROR'.
                Type is always 'TEXT'.
     """
-    if not params or not params[0]:
-        logging.error("EXECUTE: Missing program path")
-        return 'ERROR', 'TEXT', 'Missing program path.'
-
     program_path = params[0]
-    logging.info(f"Handling EXECUTE for: {program_path}")
+    logging.info("Handling EXECUTE for: %s", program_path)
     try:
-        subprocess.Popen(program_path)
+        if sys.platform == 'win32':
+            subprocess.Popen(program_path, close_fds=False,
+                             creationflags=subprocess.DETACHED_PROCESS | subprocess.CREATE_NEW_PROCESS_GROUP)
+        else:
+            subprocess.Popen(program_path, close_fds=False)
         logging.info("EXECUTE success")
         return 'OK', 'TEXT', f"Program {program_path} launched successfully."
     except Exception as err:
-        logging.error(f"EXECUTE error: {err}")
+        logging.error("EXECUTE error: %s", err)
         return 'ERROR', 'TEXT', f"Error executing program: {err}"
 
 
+def _grab_screen() -> Image.Image:
+    """Captures the primary monitor with a cached mss instance.
+
+    Returns:
+        Image.Image: The captured desktop as an RGB image.
+    """
+    global _SCT
+    with _SCT_LOCK:
+        if _SCT is None:
+            _SCT = mss.mss()
+        raw = _SCT.grab(_SCT.monitors[1])
+    return Image.frombuffer('RGB', raw.size, raw.raw, 'raw', 'BGRX', 0, 1)
+
+
+def _capture_screenshot() -> bytes:
+    """Captures and JPEG-encodes the desktop. Runs on the screenshot executor thread.
+
+    The encoded image is also written to TEMP_DIR when SAVE_SCREENSHOT_TO_DISK is set. The file
+    is swapped in whole, so other worker processes never read a half-written image.
+
+    Returns:
+        bytes: The encoded JPEG.
+    """
+    image = _grab_screen()
+    image.thumbnail(SCREENSHOT_MAX_SIZE, Image.Resampling.BILINEAR)
+    buffer = io.BytesIO()
+    image.save(buffer, format='JPEG', quality=SCREENSHOT_QUALITY, optimize=True, subsampling=2)
+    screenshot_data = buffer.getvalue()
+
+    if SAVE_SCREENSHOT_TO_DISK:
+        temp_path = f"{SCREENSHOT_PATH}.{os.getpid()}.tmp"
+        with open(temp_path, 'wb') as file_obj:
+            file_obj.write(screenshot_data)
+        os.replace(temp_path, SCREENSHOT_PATH)
+
+    logging.info("SCREENSHOT captured (%d bytes)", len(screenshot_data))
+    return screenshot_data
+
+
 def handle_screenshot(_params, _sock):
-    """Handles the SCREENSHOT command, capturing the server's desktop and saving it locally.
+    """Handles the SCREENSHOT command, starting a desktop capture in the background.
+
+    The capture runs on the screenshot executor so the handler returns right away;
+    SEND_PHOTO waits for it to finish and reports any capture error. When SAVE_SCREENSHOT_TO_DISK
+    is set the handler waits for the file instead, since SEND_PHOTO may be served by another
+    worker process that only sees the disk copy.
 
     Args:
         _params: Command parameters (unused).
@@ -158,23 +350,44 @@ def handle_screenshot(_params, _sock):
                Status can be 'OK' or 'ERROR'.
                Type is always 'TEXT'.
     """
+    global _LAST_SCREENSHOT
     logging.info("Handling SCREENSHOT")
     try:
-        image = pyautogui.screenshot()
-        os.makedirs(TEMP_DIR, exist_ok=True)
-        image.save(os.path.join(TEMP_DIR, SCREENSHOT_FILENAME))
-        logging.info("SCREENSHOT saved")
-        return 'OK', 'TEXT', f"Screenshot saved in {TEMP_DIR}."
+        _LAST_SCREENSHOT = _SCREENSHOT_EXECUTOR.submit(_capture_screenshot)
+        if SAVE_SCREENSHOT_TO_DISK:
+            _LAST_SCREENSHOT.result()
+            return 'OK', 'TEXT', "Screenshot saved."
+        return 'OK', 'TEXT', "Screenshot capture started."
     except Exception as err:
-        logging.error(f"SCREENSHOT error: {err}")
+        logging.error("SCREENSHOT error: %s", err)
         return 'ERROR', 'TEXT', f"Error taking screenshot: {err}"
 
 
+def _set_cork(sock, enabled: bool):
+    """Corks the socket so the SIZE message, image bytes and final status leave as full segments.
+
+    Falls back to disabling Nagle (TCP_NODELAY) where TCP_CORK is unavailable (e.g., Windows).
+
+    Args:
+        sock: The connected socket.
+        enabled (bool): True to cork, False to release the cork and flush.
+    """
+    try:
+        if hasattr(socket, 'TCP_CORK'):
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_CORK, int(enabled))
+        elif enabled:
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    except OSError as err:
+        logging.warning("Could not set TCP cork: %s", err)
+
+
 def handle_send_photo(_params, sock):
-    """Handles the SEND_PHOTO command, transferring the saved screenshot file to the client.
+    """Handles the SEND_PHOTO command, transferring the last screenshot to the client.
 
     This function manages the file size prefix and sends raw binary data, communicating the
-    transfer status directly over the socket.
+    transfer status directly over the socket. When SAVE_SCREENSHOT_TO_DISK is set, the copy
+    saved in TEMP_DIR is always sent: it holds the latest capture of every worker process.
+    Otherwise the in-memory screenshot is sent, waiting for a capture still in progress.
 
     Args:
         _params: Command parameters (unused).
@@ -186,38 +399,66 @@ def handle_send_photo(_params, sock):
                directly via the socket.
     """
     logging.info("Handling SEND_PHOTO")
-    file_path = os.path.join(TEMP_DIR, SCREENSHOT_FILENAME)
-
-    if not os.path.exists(file_path):
-        logging.error("SEND_PHOTO: File not found")
-        msg = protocol.create_response_message(
-            'ERROR', 'TEXT', 'Screenshot not found. Run SCREENSHOT first.'
-        )
+    screenshot_future = _LAST_SCREENSHOT
+    screenshot_data = None
+
+    if screenshot_future is not None:
+        try:
+            screenshot_data = screenshot_future.result()
+        except Exception as err:
+            logging.error("SCREENSHOT error: %s", err)
+            msg = protocol.create_response_text('ERROR', f"Error taking screenshot: {err}")
+            protocol.send_message(sock, msg)
+            return 'COMPLETED_RESPONSE', 'TEXT', 'N/A'
+    if SAVE_SCREENSHOT_TO_DISK:
+        # Another worker may have captured since; the shared file is the latest screenshot
+        screenshot_data = None
+    elif screenshot_future is None:
+        # Any file on disk is a leftover from an older run, not this server's last capture
+        logging.error("SEND_PHOTO: No screenshot taken")
+        msg = protocol.create_response_text('ERROR', 'Screenshot not found. Run SCREENSHOT first.')
         protocol.send_message(sock, msg)
         return 'COMPLETED_RESPONSE', 'TEXT', 'N/A'
 
+    _set_cork(sock, True)
     try:
-        file_size = os.path.getsize(file_path)
-        size_msg = protocol.create_response_message('FILE', 'SIZE', str(file_size))
-        protocol.send_message(sock, size_msg)
-
-        with open(file_path, 'rb') as file_obj:
-            sock.sendall(file_obj.read())
+        if screenshot_data is not None:
+            size_msg = protocol.create_response_text(
+                'FILE', str(len(screenshot_data)), data_type='SIZE'
+            )
+            protocol.send_message(sock, size_msg, screenshot_data)
+        else:
+            with open(SCREENSHOT_PATH, 'rb') as file_obj:
+                file_size = os.fstat(file_obj.fileno()).st_size
+                size_msg = protocol.create_response_text('FILE', str(file_size), data_type='SIZE')
+                protocol.send_message(sock, size_msg)
+                sock.sendfile(file_obj)
 
         logging.info("SEND_PHOTO: Data sent")
-        final_msg = protocol.create_response_message(
-            'OK', 'TEXT', f"File {SCREENSHOT_FILENAME} sent successfully."
+        final_msg = protocol.create_response_text(
+            'OK', f"File {SCREENSHOT_FILENAME} sent successfully."
         )
         protocol.send_message(sock, final_msg)
 
         return 'COMPLETED_RESPONSE', 'TEXT', 'N/A'
 
+    except FileNotFoundError:
+        logging.error("SEND_PHOTO: File not found")
+        msg = protocol.create_response_text(
+            'ERROR', 'Screenshot not found. Run SCREENSHOT first.'
+        )
+        protocol.send_message(sock, msg)
+        return 'COMPLETED_RESPONSE', 'TEXT', 'N/A'
+
     except Exception as err:
-        logging.error(f"SEND_PHOTO error: {err}")
-        err_msg = protocol.create_response_message('ERROR', 'TEXT', f"Error: {err}")
+        logging.error("SEND_PHOTO error: %s", err)
+        err_msg = protocol.create_response_text('ERROR', f"Error: {err}")
         protocol.send_message(sock, err_msg)
         return 'COMPLETED_RESPONSE', 'TEXT', 'N/A'
 
+    finally:
+        _set_cork(sock, False)
+
 
 def handle_exit(_params, _sock):
     """Handles the EXIT command, signaling the intent to close the connection.
@@ -234,6 +475,17 @@ def handle_exit(_params, _sock):
     return 'OK', 'TEXT', 'Connection closing.'
 
 
+COMMAND_TABLE = {
+    'DIR': handle_dir,
+    'DELETE': handle_delete,
+    'COPY': handle_copy,
+    'EXECUTE': handle_execute,
+    'SCREENSHOT': handle_screenshot,
+    'SEND_PHOTO': handle_send_photo,
+    'EXIT': handle_exit
+}
+
+
 if __name__ == "__main__":
 
     logging.basicConfig(filename='functions.log', level=logging.INFO,
@@ -253,6 +505,14 @@ if __name__ == "__main__":
         def sendall(_data):
             pass
 
+        @staticmethod
+        def sendfile(_file):
+            pass
+
+        @staticmethod
+        def setsockopt(*_args):
+            pass
+
         @staticmethod
         def recv(_size):
             return b''
@@ -316,6 +576,39 @@ if __name__ == "__main__":
     assert dir_status == 'OK', "DIR Failed"
     assert dir_type == 'LIST', "DIR Type Failed"
 
+    logging.info("Testing DIR patterns...")
+    TEST_DIR_TREE = "test_temp_dir_for_dir_assert"
+    shutil.rmtree(TEST_DIR_TREE, ignore_errors=True)
+
+    try:
+        os.makedirs(os.path.join(TEST_DIR_TREE, "sub"))
+        for test_name in ("a.txt", "b.log", ".hidden.txt", os.path.join("sub", "c.txt")):
+            with open(os.path.join(TEST_DIR_TREE, test_name), 'w') as f_test:
+                f_test.write("DIR test")
+
+        _, _, tree_content = handle_dir([TEST_DIR_TREE], mock_sock)
+        assert sorted(tree_content) == ['a.txt', 'b.log', 'sub/'], "DIR Listing Failed"
+
+        pattern_status, _, pattern_content = handle_dir(
+            [os.path.join(TEST_DIR_TREE, "*.txt")], mock_sock)
+        assert pattern_status == 'OK', "DIR Pattern Failed"
+        assert pattern_content == ['a.txt'], "DIR Pattern Failed: hidden or wrong files matched"
+
+        _, _, hidden_content = handle_dir([os.path.join(TEST_DIR_TREE, ".*")], mock_sock)
+        assert hidden_content == ['.hidden.txt'], "DIR Hidden Pattern Failed"
+
+        file_result = handle_dir([os.path.join(TEST_DIR_TREE, "a.txt")], mock_sock)
+        assert file_result == ('OK', 'LIST', ['a.txt']), "DIR Literal File Failed"
+
+        missing_status, _, _ = handle_dir([os.path.join(TEST_DIR_TREE, "nope")], mock_sock)
+        assert missing_status == 'ERROR', "DIR Missing Path Failed"
+
+        _, _, nested_content = handle_dir([os.path.join(TEST_DIR_TREE, "*", "*.txt")], mock_sock)
+        assert nested_content == ['c.txt'], "DIR Multi-Component Pattern Failed"
+
+    finally:
+        shutil.rmtree(TEST_DIR_TREE, ignore_errors=True)
+
     logging.info("Testing EXECUTE...")
     exec_status, exec_type, exec_data = handle_execute([], mock_sock)
     assert exec_status == 'ERROR', "EXECUTE Failed"
@@ -4,75 +4,291 @@
 
 import time
 import socket
+import struct
+import asyncio
 import logging
 
 # Protocol Constants
 LENGTH_FIELD_SIZE = 4
+LENGTH_STRUCT = struct.Struct('>I')  # Big-endian unsigned length prefix, LENGTH_FIELD_SIZE bytes
+MAX_FRAME_SIZE = 16 * 1024 * 1024  # Longer prefixes are corrupt or hostile; the peer is dropped
 DELIMITER = "#@"
+DELIMITER_SIZE = len(DELIMITER)
 PARAM_SEPARATOR = "/"
 ENCODING = 'utf-8'
+RECV_BUFFER_SIZE = 16384
 
+# Binary command frames: u8 command id, u16 param count, then a u32 length and UTF-8 bytes
+# per param. Ids stay below 0x20, so a frame whose first byte is printable is a text message.
+COMMAND_IDS = ('DIR', 'DELETE', 'COPY', 'EXECUTE', 'SCREENSHOT', 'SEND_PHOTO', 'EXIT')
+COMMAND_HEADER_STRUCT = struct.Struct('>BH')
+BINARY_ID_LIMIT = 0x20
+assert len(COMMAND_IDS) <= BINARY_ID_LIMIT, "Command ids would collide with text frames"
+_COMMAND_ID_BY_NAME = {name: command_id for command_id, name in enumerate(COMMAND_IDS)}
+# Canonical (interned literal) instance of each known command name
+_KNOWN_COMMANDS = {name: name for name in COMMAND_IDS}
 
-def send_message(sock: socket.socket, raw_data: str) -> bool:
-    """Encodes and sends a message with a length prefix.
+logger = logging.getLogger(__name__)
+
+# (second, formatted second) of the last command timestamp
+_last_timestamp = (0, '0')
+
+
+def _sendmsg_all(sock: socket.socket, buffers: list):
+    """Sends several buffers with a single scatter-gather call, without joining them first.
+
+    Falls back to one sendall per buffer where sendmsg is unavailable (e.g., Windows).
 
     Args:
         sock (socket.socket): The connected socket.
-        raw_data (str): The string message to send.
+        buffers (list): The bytes-like objects to send, in order.
+    """
+    if not hasattr(sock, 'sendmsg'):
+        for buffer in buffers:
+            sock.sendall(buffer)
+        return
+
+    views = [memoryview(buffer) for buffer in buffers]
+    while views:
+        sent = sock.sendmsg(views)
+        # Drop the buffers the kernel took in full and trim a partially sent one
+        while views and sent >= len(views[0]):
+            sent -= len(views.pop(0))
+        if views:
+            views[0] = views[0][sent:]
+
+
+def send_frame(sock: socket.socket, frame: bytes, payload: bytes | None = None) -> bool:
+    """Sends an already encoded frame with a length prefix.
+
+    Args:
+        sock (socket.socket): The connected socket.
+        frame (bytes): The encoded message (text or binary command).
+        payload (bytes | None): Raw bytes to send right after the message (e.g., a file).
 
     Returns:
         bool: True if sent successfully, False otherwise.
     """
     try:
-        encoded_data = raw_data.encode(ENCODING)
-        data_length = len(encoded_data)
+        length_prefix = LENGTH_STRUCT.pack(len(frame))
+        buffers = [length_prefix, frame]
+        if payload:
+            buffers.append(payload)
 
-        length_prefix = str(data_length).zfill(LENGTH_FIELD_SIZE)
-        full_message = length_prefix.encode(ENCODING) + encoded_data
-
-        sock.sendall(full_message)
-        logging.debug(f"Message sent: {raw_data}")
+        _sendmsg_all(sock, buffers)
         return True
-    except Exception as e:
-        logging.error(f"Failed to send message: {e}")
+    except OSError as e:
+        logger.error("Failed to send message: %s", e)
         return False
 
 
-def receive_message(sock: socket.socket) -> str | None:
-    """Receives a message by reading the length prefix first.
+def send_message(sock: socket.socket, raw_data: str, payload: bytes | None = None) -> bool:
+    """Encodes and sends a message with a length prefix.
 
     Args:
         sock (socket.socket): The connected socket.
+        raw_data (str): The string message to send.
+        payload (bytes | None): Raw bytes to send right after the message (e.g., a file).
 
     Returns:
-        str | None: The decoded message or None if failed.
+        bool: True if sent successfully, False otherwise.
     """
     try:
-        length_prefix_bytes = sock.recv(LENGTH_FIELD_SIZE)
+        encoded_data = raw_data.encode(ENCODING)
+    except UnicodeEncodeError as e:
+        logger.error("Failed to send message: %s", e)
+        return False
+
+    if not send_frame(sock, encoded_data, payload):
+        return False
+    logger.debug("Message sent: %s", raw_data)
+    return True
+
+
+class MessageReader:
+    """Reads length-prefixed messages from a socket through a reusable receive buffer.
+
+    Data is received with recv_into straight into one preallocated buffer that lives as long
+    as the reader, so steady-state reads allocate nothing but the decoded message. The
+    buffer only grows when a single message does not fit, and unread bytes are moved back
+    to its start instead of reallocating. Bytes past the current message stay buffered, so
+    raw data sent after a message (the SEND_PHOTO file bytes) must be read through
+    read_exact rather than from the socket directly.
+    """
+
+    def __init__(self, sock: socket.socket):
+        self.sock = sock
+        self._buffer = bytearray(RECV_BUFFER_SIZE)
+        self._view = memoryview(self._buffer)
+        self._start = 0  # First unread byte
+        self._end = 0  # End of the received data
+
+    def _make_room(self, needed: int):
+        """Ensures `needed` bytes fit in the buffer from the first unread byte onwards.
+
+        Args:
+            needed (int): The number of unread bytes the buffer must be able to hold.
+        """
+        pending = self._end - self._start
+        if needed > len(self._buffer):
+            new_buffer = bytearray(max(needed, 2 * len(self._buffer)))
+            new_buffer[:pending] = self._view[self._start:self._end]
+            self._view.release()
+            self._buffer = new_buffer
+            self._view = memoryview(new_buffer)
+        else:
+            self._view[:pending] = self._view[self._start:self._end]
+        self._start = 0
+        self._end = pending
+
+    def _fill(self, needed: int) -> bool:
+        """Receives into the buffer until it holds at least `needed` unread bytes.
+
+        Args:
+            needed (int): The number of unread bytes required.
+
+        Returns:
+            bool: False if the connection closed first.
+        """
+        if self._start + needed > len(self._buffer):
+            self._make_room(needed)
+
+        while self._end - self._start < needed:
+            received = self.sock.recv_into(self._view[self._end:])
+            if not received:
+                return False
+            self._end += received
+        return True
+
+    def _consume(self, size: int):
+        """Marks `size` bytes as read, rewinding to the buffer start once it is drained.
+
+        Args:
+            size (int): The number of bytes read.
+        """
+        self._start += size
+        if self._start == self._end:
+            self._start = self._end = 0
+
+    def read_frame(self) -> str | None:
+        """Receives a message by reading the length prefix first.
 
-        if not length_prefix_bytes:
+        Returns:
+            str | None: The decoded message or None if failed.
+        """
+        try:
+            if not self._fill(LENGTH_FIELD_SIZE):
+                return None
+
+            expected_length, = LENGTH_STRUCT.unpack_from(self._buffer, self._start)
+            if expected_length > MAX_FRAME_SIZE:
+                logger.error("Rejecting frame of %d bytes (limit %d)",
+                             expected_length, MAX_FRAME_SIZE)
+                return None
+            frame_size = LENGTH_FIELD_SIZE + expected_length
+            if not self._fill(frame_size):
+                return None
+
+            # Decode straight out of the buffer instead of slicing a copy of the payload first
+            payload_start = self._start + LENGTH_FIELD_SIZE
+            raw_data = str(self._view[payload_start:self._start + frame_size], ENCODING)
+            self._consume(frame_size)
+            logger.debug("Message received: %s", raw_data)
+            return raw_data
+
+        except Exception as e:
+            logger.error("Error receiving message: %s", e)
             return None
 
-        length_prefix = length_prefix_bytes.decode(ENCODING)
-        expected_length = int(length_prefix)
+    def _read_large(self, size: int) -> bytearray | None:
+        """Receives `size` bytes straight into a buffer of their own, bypassing the arena.
 
-        chunks = []
-        bytes_recd = 0
+        Args:
+            size (int): The number of bytes to read.
 
-        while bytes_recd < expected_length:
-            chunk = sock.recv(expected_length - bytes_recd)
-            if not chunk:
+        Returns:
+            bytearray | None: The data or None if the connection closed first.
+        """
+        data = bytearray(size)
+        view = memoryview(data)
+        offset = self._end - self._start
+        view[:offset] = self._view[self._start:self._end]
+        self._start = self._end = 0
+
+        while offset < size:
+            received = self.sock.recv_into(view[offset:])
+            if not received:
                 return None
+            offset += received
+        return data
+
+    def read_exact(self, size: int) -> bytes | bytearray | None:
+        """Receives exactly `size` raw bytes (e.g., a file following a SIZE message).
 
-            chunks.append(chunk)
-            bytes_recd += len(chunk)
+        Reads larger than the receive buffer go straight into one preallocated buffer of
+        their own, so a big file neither grows the arena nor gets copied out of it.
 
-        raw_data = b"".join(chunks).decode(ENCODING)
-        logging.debug(f"Message received: {raw_data}")
-        return raw_data
+        Args:
+            size (int): The number of bytes to read.
 
+        Returns:
+            bytes | bytearray | None: The data or None if the connection closed first.
+        """
+        if size > len(self._buffer):
+            return self._read_large(size)
+
+        if not self._fill(size):
+            return None
+
+        data = bytes(self._view[self._start:self._start + size])
+        self._consume(size)
+        return data
+
+
+async def send_message_async(writer: asyncio.StreamWriter, raw_data: str) -> bool:
+    """Encodes and sends a message with a length prefix over an asyncio stream.
+
+    Args:
+        writer (asyncio.StreamWriter): The client's outgoing stream.
+        raw_data (str): The string message to send.
+
+    Returns:
+        bool: True if sent successfully, False otherwise.
+    """
+    try:
+        encoded_data = raw_data.encode(ENCODING)
+        length_prefix = LENGTH_STRUCT.pack(len(encoded_data))
+
+        writer.writelines((length_prefix, encoded_data))
+        await writer.drain()
+        logger.debug("Message sent: %s", raw_data)
+        return True
+    except (OSError, UnicodeEncodeError) as e:
+        logger.error("Failed to send message: %s", e)
+        return False
+
+
+async def receive_frame_async(reader: asyncio.StreamReader) -> bytes | None:
+    """Receives one raw frame from an asyncio stream by reading the length prefix first.
+
+    Args:
+        reader (asyncio.StreamReader): The client's incoming stream.
+
+    Returns:
+        bytes | None: The undecoded frame or None if failed.
+    """
+    try:
+        length_prefix_bytes = await reader.readexactly(LENGTH_FIELD_SIZE)
+        expected_length, = LENGTH_STRUCT.unpack(length_prefix_bytes)
+        if expected_length > MAX_FRAME_SIZE:
+            logger.error("Rejecting frame of %d bytes (limit %d)", expected_length, MAX_FRAME_SIZE)
+            return None
+        return await reader.readexactly(expected_length)
+
+    except asyncio.IncompleteReadError:
+        return None
     except Exception as e:
-        logging.error(f"Error receiving message: {e}")
+        logger.error("Error receiving message: %s", e)
         return None
 
 
@@ -85,27 +301,106 @@ def parse_message(message: str) -> dict:
     Returns:
         dict: Contains 'command', 'type', and 'params'.
     """
-    try:
-        parts = message.split(DELIMITER, 2)
+    # Locate both delimiters in one pass and slice, rather than building a parts list
+    delimiter = DELIMITER
+    first = message.find(delimiter)
+    second = message.find(delimiter, first + DELIMITER_SIZE) if first >= 0 else -1
+    if second < 0:
+        return _invalid_message(f"expected 3 fields in {message!r}")
+
+    # Commands are case-insensitive. Known names map to their interned literal so dispatch
+    # compares by identity; anything else (unknown or garbage names) is left uninterned.
+    command_or_status = message[:first].upper()
+    command_or_status = _KNOWN_COMMANDS.get(command_or_status, command_or_status)
+    timestamp_or_type = message[first + DELIMITER_SIZE:second]
+    data_string = message[second + DELIMITER_SIZE:]
+
+    params = data_string.split(PARAM_SEPARATOR)
+
+    return {
+        'command': command_or_status,
+        'type': timestamp_or_type,
+        'params': params
+    }
+
+
+def _invalid_message(reason: str) -> dict:
+    """Logs a malformed message and returns the parse result that reports it.
+
+    Args:
+        reason (str): What was wrong with the message.
+
+    Returns:
+        dict: An ERROR result in parse_message's format.
+    """
+    logger.error("Error parsing message: %s", reason)
+    return {
+        'command': 'ERROR',
+        'type': 'TEXT',
+        'params': ['Invalid protocol format.']
+    }
 
-        command_or_status = parts[0]
-        timestamp_or_type = parts[1]
-        data_string = parts[2]
 
-        params = data_string.split(PARAM_SEPARATOR)
+def parse_frame(frame: bytes) -> dict:
+    """Parses a received frame, either a binary command or a text message.
+
+    Args:
+        frame (bytes): The frame as received, without its length prefix.
+
+    Returns:
+        dict: Contains 'command', 'type' (empty for binary commands) and 'params'.
+    """
+    try:
+        if not frame or frame[0] >= BINARY_ID_LIMIT:
+            return parse_message(frame.decode(ENCODING))
+
+        if len(frame) < COMMAND_HEADER_STRUCT.size:
+            return _invalid_message("truncated command header")
+        command_id, param_count = COMMAND_HEADER_STRUCT.unpack_from(frame)
+        if command_id >= len(COMMAND_IDS):
+            return _invalid_message(f"unknown command id {command_id}")
+
+        # Globals and bound methods used per param are looked up once, outside the loop
+        view = memoryview(frame)
+        frame_size = len(frame)
+        field_size = LENGTH_FIELD_SIZE
+        unpack_length = LENGTH_STRUCT.unpack_from
+        encoding = ENCODING
+        params = []
+        offset = COMMAND_HEADER_STRUCT.size
+        for _ in range(param_count):
+            if offset + field_size > frame_size:
+                return _invalid_message("truncated param length")
+            param_length, = unpack_length(frame, offset)
+            offset += field_size
+            if offset + param_length > frame_size:
+                return _invalid_message("truncated param")
+            params.append(str(view[offset:offset + param_length], encoding))
+            offset += param_length
+
+        if offset != frame_size:
+            return _invalid_message("trailing bytes")
 
         return {
-            'command': command_or_status,
-            'type': timestamp_or_type,
+            'command': COMMAND_IDS[command_id],
+            'type': '',
             'params': params
         }
-    except Exception as e:
-        logging.error(f"Error parsing message: {e}")
-        return {
-            'command': 'ERROR',
-            'type': 'TEXT',
-            'params': ['Invalid protocol format.']
-        }
+    except UnicodeDecodeError as e:
+        return _invalid_message(str(e))
+
+
+def _timestamp() -> str:
+    """Returns the current Unix second as a string, formatting it at most once per second.
+
+    Returns:
+        str: The timestamp string.
+    """
+    global _last_timestamp
+    now = int(time.time())
+    if now != _last_timestamp[0]:
+        _last_timestamp = (now, str(now))
+    return _last_timestamp[1]
 
 
 def create_command_message(command: str, params: list) -> str:
@@ -118,14 +413,70 @@ def create_command_message(command: str, params: list) -> str:
     Returns:
         str: The formatted message.
     """
-    timestamp = str(int(time.time()))
     data_string = PARAM_SEPARATOR.join(params)
-    return f"{command}{DELIMITER}{timestamp}{DELIMITER}{data_string}"
+    return f"{command}{DELIMITER}{_timestamp()}{DELIMITER}{data_string}"
+
+
+def create_command_frame(command: str, params: list) -> bytes:
+    """Creates an encoded binary command frame.
+
+    Commands without an id in COMMAND_IDS fall back to the text format, which the server
+    still accepts.
+
+    Args:
+        command (str): The command name.
+        params (list): List of parameters.
+
+    Returns:
+        bytes: The frame, ready for send_frame.
+    """
+    command_id = _COMMAND_ID_BY_NAME.get(command)
+    if command_id is None:
+        return create_command_message(command, params).encode(ENCODING)
+
+    parts = [COMMAND_HEADER_STRUCT.pack(command_id, len(params))]
+    pack_length = LENGTH_STRUCT.pack
+    encoding = ENCODING
+    for param in params:
+        encoded_param = param.encode(encoding)
+        parts.append(pack_length(len(encoded_param)))
+        parts.append(encoded_param)
+    return b''.join(parts)
+
+
+def create_response_text(status: str, text: str, *, data_type: str = 'TEXT') -> str:
+    """Creates a formatted response message carrying a single string.
+
+    Args:
+        status (str): Status code (OK/ERROR/FILE).
+        text (str): The content.
+        data_type (str): Type of data (TEXT/SIZE).
+
+    Returns:
+        str: The formatted message.
+    """
+    return f"{status}{DELIMITER}{data_type}{DELIMITER}{text}"
+
+
+def create_response_list(status: str, items: list) -> str:
+    """Creates a formatted LIST response message.
+
+    Args:
+        status (str): Status code (OK/ERROR).
+        items (list): The strings to send, joined by PARAM_SEPARATOR.
+
+    Returns:
+        str: The formatted message.
+    """
+    return f"{status}{DELIMITER}LIST{DELIMITER}{PARAM_SEPARATOR.join(items)}"
 
 
 def create_response_message(status: str, data_type: str, data: str | list) -> str:
     """Creates a formatted response message.
 
+    Deprecated: callers that know their data type should use create_response_text or
+    create_response_list, which skip the type checks below.
+
     Args:
         status (str): Status code (OK/ERROR).
         data_type (str): Type of data (TEXT/LIST/SIZE).
@@ -134,6 +485,9 @@ def create_response_message(status: str, data_type: str, data: str | list) -> st
     Returns:
         str: The formatted message.
     """
+    if isinstance(data, str):
+        return f"{status}{DELIMITER}{data_type}{DELIMITER}{data}"
+
     if isinstance(data, list):
         data_string = PARAM_SEPARATOR.join(data)
     else:
@@ -145,7 +499,7 @@ def create_response_message(status: str, data_type: str, data: str | list) -> st
 def run_diagnostics():
     """Runs self-tests before execution."""
     print("--- Running Protocol Self-Tests ---")
-    logging.info("Starting Protocol Tests")
+    logger.info("Starting Protocol Tests")
 
     # 1. Test command message creation
     cmd_msg = create_command_message("TEST", ["param1", "param2"])
@@ -154,15 +508,50 @@ def run_diagnostics():
     assert "param1/param2" in cmd_msg, "Params failed"
 
     # 2. Test response message creation
-    resp_msg = create_response_message("OK", "TEXT", "Success")
+    resp_msg = create_response_text("OK", "Success")
     assert resp_msg.startswith("OK#@TEXT#@Success"), "Response construction failed"
+    assert create_response_list("OK", ["a", "b"]) == "OK#@LIST#@a/b", "List response failed"
+    assert create_response_message("OK", "TEXT", "Success") == resp_msg, "Generic response failed"
 
     # 3. Test message parsing
     parsed = parse_message("DIR#@123456#@C:\\Windows")
     assert parsed['command'] == 'DIR', "Command parsing failed"
     assert parsed['params'][0] == 'C:\\Windows', "Param parsing failed"
 
-    logging.info("Protocol Tests Finished Successfully")
+    # 4. Test binary command frames and the text fallback
+    frame = create_command_frame("COPY", ["C:\\a b.txt", "D:/é"])
+    parsed = parse_frame(frame)
+    assert parsed['command'] == 'COPY', "Binary command parsing failed"
+    assert parsed['params'] == ["C:\\a b.txt", "D:/é"], "Binary param parsing failed"
+    assert parse_frame(frame[:-1])['command'] == 'ERROR', "Truncated frame accepted"
+    assert parse_frame(frame + b'x')['command'] == 'ERROR', "Trailing bytes accepted"
+    assert parse_frame(create_command_frame("EXIT", []))['params'] == [], "Empty params failed"
+    text_frame = create_command_frame("BOGUS", ["x"])
+    assert parse_frame(text_frame)['command'] == 'BOGUS', "Text fallback failed"
+
+    # 5. Test that oversized length prefixes are refused without reading the payload
+    sender, receiver = socket.socketpair()
+    try:
+        sender.sendall(b'0009DIR#@1#@.')  # Old decimal framing reads as an ~808 MB length
+        assert MessageReader(receiver).read_frame() is None, "Oversized frame accepted"
+    finally:
+        sender.close()
+        receiver.close()
+
+    # 6. Test framing round-trip, including a message longer than 9999 bytes
+    sender, receiver = socket.socketpair()
+    try:
+        long_msg = create_response_text("OK", "x" * 20000)
+        assert send_message(sender, long_msg), "Sending failed"
+        assert send_message(sender, resp_msg), "Sending failed"
+        reader = MessageReader(receiver)
+        assert reader.read_frame() == long_msg, "Long message framing failed"
+        assert reader.read_frame() == resp_msg, "Pipelined message framing failed"
+    finally:
+        sender.close()
+        receiver.close()
+
+    logger.info("Protocol Tests Finished Successfully")
 
 
 if __name__ == "__main__":
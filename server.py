@@ -2,121 +2,275 @@
 # Date   - 11/22/25
 # Server
 
+import asyncio
+import contextlib
 import socket
-import threading
+import sys
 import os
+import signal
 import logging
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor
 import function as handlers
 import protocol_utils as protocol
 
 SERVER_IP = '0.0.0.0'
 PORT = 12345
 TEMP_DIR = "server_temp"
+# Linux load-balances SO_REUSEPORT listeners across processes; elsewhere a single process serves.
+WORKER_PROCESSES = (os.cpu_count() or 1) if sys.platform.startswith('linux') else 1
+HANDLER_THREADS = 256
+CLIENT_IDLE_TIMEOUT = 30 * 60
 
-COMMAND_HANDLERS = {
-    'DIR': handlers.handle_dir,
-    'DELETE': handlers.handle_delete,
-    'COPY': handlers.handle_copy,
-    'EXECUTE': handlers.handle_execute,
-    'SCREENSHOT': handlers.handle_screenshot,
-    'SEND_PHOTO': handlers.handle_send_photo,
-    'EXIT': handlers.handle_exit
-}
+COMMAND_HANDLERS = handlers.COMMAND_TABLE
 
+logger = logging.getLogger(__name__)
 
-def handle_client(client_socket: socket.socket):
+
+class StreamSocket:
+    """Blocking socket-like view of an asyncio stream for handlers running in worker threads.
+
+    Handlers such as SEND_PHOTO write to their socket directly; these calls are forwarded
+    to the event loop and block the calling thread until they complete.
+    """
+
+    def __init__(self, writer: asyncio.StreamWriter, loop: asyncio.AbstractEventLoop):
+        self._writer = writer
+        self._loop = loop
+
+    def _run(self, coro):
+        return asyncio.run_coroutine_threadsafe(coro, self._loop).result()
+
+    async def _writelines(self, buffers: list):
+        self._writer.writelines(buffers)
+        await self._writer.drain()
+
+    def sendmsg(self, buffers: list) -> int:
+        self._run(self._writelines(buffers))
+        return sum(len(buffer) for buffer in buffers)
+
+    def sendfile(self, file, offset: int = 0, count: int | None = None) -> int:
+        return self._run(self._loop.sendfile(self._writer.transport, file, offset, count))
+
+    def setsockopt(self, *args):
+        self._writer.get_extra_info('socket').setsockopt(*args)
+
+
+class IdleTimer:
+    """Fires a callback once a connection has been idle for `timeout` seconds.
+
+    A single timer serves the whole connection: marking activity only records a timestamp,
+    and the timer re-arms itself for the remaining time when it fires early. Reads therefore
+    need no per-message timeout wrapper, and pipelined frames already in the stream buffer
+    are consumed without creating any tasks or timers.
+    """
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, timeout: float, on_idle):
+        self._loop = loop
+        self._timeout = timeout
+        self._on_idle = on_idle
+        self._idle_since = loop.time()
+        self.expired = False
+        self._handle = loop.call_later(timeout, self._check)
+
+    def busy(self):
+        """Suspends the countdown while a command is being handled."""
+        self._idle_since = None
+
+    def idle(self):
+        """Restarts the countdown from now."""
+        self._idle_since = self._loop.time()
+
+    def cancel(self):
+        self._handle.cancel()
+
+    def _check(self):
+        if self._idle_since is None:
+            remaining = self._timeout
+        else:
+            remaining = self._idle_since + self._timeout - self._loop.time()
+
+        if remaining > 0:
+            self._handle = self._loop.call_later(remaining, self._check)
+        else:
+            self.expired = True
+            self._on_idle()
+
+
+async def handle_client(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
     """Handles the communication with a single client.
 
+    Command handlers do blocking file/screen I/O, so they run in the loop's bounded
+    handler thread pool. Clients idle for CLIENT_IDLE_TIMEOUT seconds are disconnected.
+    Frames a client pipelines arrive in one read and are dispatched back to back from the
+    stream buffer.
+
     Args:
-        client_socket (socket.socket): The connected client socket.
+        reader (asyncio.StreamReader): The client's incoming stream.
+        writer (asyncio.StreamWriter): The client's outgoing stream.
     """
+    addr = writer.get_extra_info('peername')
+    loop = asyncio.get_running_loop()
+    client_socket = StreamSocket(writer, loop)
+    # Aborting the transport ends the pending read, which then returns None
+    idle_timer = IdleTimer(loop, CLIENT_IDLE_TIMEOUT, writer.transport.abort)
     try:
-        addr = client_socket.getpeername()
         print(f"--- New client connected from {addr} ---")
-        logging.info(f"New connection from {addr}")
+        logger.info("New connection from %s", addr)
 
         while True:
-            raw_message = protocol.receive_message(client_socket)
+            idle_timer.idle()
+            frame = await protocol.receive_frame_async(reader)
 
-            if not raw_message:
-                logging.info(f"Client {addr} disconnected.")
+            if not frame:
+                if idle_timer.expired:
+                    logger.info("Client %s idle for %ss, disconnecting.", addr, CLIENT_IDLE_TIMEOUT)
+                else:
+                    logger.info("Client %s disconnected.", addr)
                 break
 
-            parsed_data = protocol.parse_message(raw_message)
-            command = parsed_data['command'].upper()
+            idle_timer.busy()
+
+            parsed_data = protocol.parse_frame(frame)
+            command = parsed_data['command']
             params = parsed_data['params']
 
-            logging.debug(f"Command: {command}, Params: {params}")
+            logger.debug("Command: %s, Params: %s", command, params)
 
-            if command in COMMAND_HANDLERS:
-                status, dtype, data = COMMAND_HANDLERS[command](params, client_socket)
+            handler = COMMAND_HANDLERS.get(command)
+            if handler is not None:
+                status, dtype, data = await asyncio.to_thread(handler, params, client_socket)
             else:
-                logging.warning(f"Unknown command: {command}")
+                logger.warning("Unknown command: %s", command)
                 status, dtype, data = 'ERROR', 'TEXT', f"Unknown command: {command}"
 
             if status != 'COMPLETED_RESPONSE':
-                response = protocol.create_response_message(status, dtype, data)
-                protocol.send_message(client_socket, response)
+                if dtype == 'LIST':
+                    response = protocol.create_response_list(status, data)
+                else:
+                    response = protocol.create_response_text(status, data, data_type=dtype)
+                await protocol.send_message_async(writer, response)
 
             if command == 'EXIT':
                 break
 
     except Exception as e:
-        logging.error(f"Error handling client: {e}")
+        logger.error("Error handling client: %s", e)
     finally:
-        if client_socket:
-            client_socket.close()
-        logging.info("Client socket closed.")
+        idle_timer.cancel()
+        writer.close()
+        try:
+            await writer.wait_closed()
+        except OSError:
+            pass
+        logger.info("Client socket closed.")
 
 
-def setup_server(ip: str, port: int) -> socket.socket:
+def setup_server(ip: str, port: int, reuse_port: bool = False) -> socket.socket:
     """Initializes the server socket.
 
     Args:
         ip (str): Server IP.
         port (int): Server Port.
+        reuse_port (bool): Set SO_REUSEPORT so several worker processes can each bind
+                           their own listening socket to the same port.
 
     Returns:
         socket.socket: The listening socket.
     """
     sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    if os.name == 'posix':
+        # Allows a quick restart over TIME_WAIT connections; a live listener still blocks bind
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    elif hasattr(socket, 'SO_EXCLUSIVEADDRUSE'):
+        # On Windows SO_REUSEADDR would let another process steal the port; forbid that instead
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_EXCLUSIVEADDRUSE, 1)
+    if reuse_port:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
     sock.bind((ip, port))
     sock.listen(5)
     return sock
 
 
-def accept_connections(server_socket: socket.socket):
-    """Main loop to accept incoming clients.
+async def accept_connections(server_socket: socket.socket):
+    """Serves incoming clients on the event loop until the server is stopped.
 
     Args:
         server_socket (socket.socket): The listening socket.
     """
-    print(f"Server listening at {SERVER_IP}:{PORT}")
-    logging.info(f"Server started on {SERVER_IP}:{PORT}")
+    logger.info("Server started on %s:%s (pid %s)", SERVER_IP, PORT, os.getpid())
 
-    while True:
-        client_socket, addr = server_socket.accept()
-        client_thread = threading.Thread(target=handle_client, args=(client_socket,))
-        client_thread.start()
+    asyncio.get_running_loop().set_default_executor(
+        ThreadPoolExecutor(max_workers=HANDLER_THREADS, thread_name_prefix='handler'))
 
+    server = await asyncio.start_server(handle_client, sock=server_socket)
+    async with server:
+        await server.serve_forever()
 
-def main():
-    """Main entry point for the server."""
-    if not os.path.exists(TEMP_DIR):
-        os.makedirs(TEMP_DIR)
 
+def serve(ip: str, port: int, reuse_port: bool = False):
+    """Runs one accept loop on its own listening socket.
+
+    Args:
+        ip (str): Server IP.
+        port (int): Server Port.
+        reuse_port (bool): Whether the socket shares the port with other worker processes.
+    """
+    if reuse_port:
+        # Each worker keeps its own in-memory screenshot; SEND_PHOTO must see the latest
+        # capture whichever worker serves it, so share it through the file on disk
+        handlers.SAVE_SCREENSHOT_TO_DISK = True
     server_socket = None
     try:
-        server_socket = setup_server(SERVER_IP, PORT)
-        accept_connections(server_socket)
+        server_socket = setup_server(ip, port, reuse_port)
+        asyncio.run(accept_connections(server_socket))
     except Exception as e:
         print(f"Server fatal error: {e}")
-        logging.critical(f"Server crashed: {e}")
+        logger.critical("Server crashed: %s", e)
     finally:
         if server_socket:
             server_socket.close()
 
 
+def _exit_on_signal(signum, _frame):
+    """Signal handler that exits the process through the normal cleanup path."""
+    logger.info("Received signal %s, stopping workers.", signum)
+    sys.exit(0)
+
+
+def main():
+    """Main entry point for the server."""
+    if not os.path.exists(TEMP_DIR):
+        os.makedirs(TEMP_DIR)
+    # A screenshot left by an older run is not this server's capture
+    with contextlib.suppress(FileNotFoundError):
+        os.remove(handlers.SCREENSHOT_PATH)
+
+    print(f"Server listening at {SERVER_IP}:{PORT}")
+    if WORKER_PROCESSES == 1:
+        serve(SERVER_IP, PORT)
+        return
+
+    workers = [multiprocessing.Process(target=serve, args=(SERVER_IP, PORT, True), daemon=True)
+               for _ in range(WORKER_PROCESSES)]
+    for worker in workers:
+        worker.start()
+
+    # SIGTERM (kill, systemd) would otherwise end only this process and orphan the workers,
+    # which keep listening on the port; turn it into an exit so the cleanup below runs
+    signal.signal(signal.SIGTERM, _exit_on_signal)
+    try:
+        for worker in workers:
+            worker.join()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for worker in workers:
+            worker.terminate()
+        for worker in workers:
+            worker.join()
+
+
 if __name__ == "__main__":
     logging.basicConfig(filename='server.log', level=logging.DEBUG,
                         format='%(asctime)s - %(levelname)s - %(message)s')